@@ -2,11 +2,14 @@ import os
 from utils.typings import Errors
 from experiment.AggregatorConfig import AggregatorConfig
 from torch import nn, Tensor
+import torch.nn.functional as F
 from client import Client
 from logger import logPrint
 from typing import List, Type
 import torch
+from copy import deepcopy
 from aggregators.Aggregator import Aggregator
+from aggregators.FedAvg import FAAggregator
 from datasetLoaders.DatasetInterface import DatasetInterface
 from sklearn.cluster import KMeans
 import matplotlib.pyplot as plt
@@ -34,6 +37,7 @@ class ClusteringAggregator(Aggregator):
         self.cluster_centres: List[nn.Module] = [None] * self.cluster_count
         self.cluster_centres_len = torch.zeros(self.cluster_count)
         self.cluster_labels = [0] * len(self.clients)
+        self.cluster_indices: List[List[int]] = [[] for _ in range(self.cluster_count)]
 
         self.internalAggregator: Aggregator = None
         self.externalAggregator: Aggregator = None
@@ -69,24 +73,40 @@ class ClusteringAggregator(Aggregator):
         self.internalAggregator = internal(self.clients, self.model, self.config)
         self.externalAggregator = external(self.clients, self.model, self.config)
 
-    def _gen_cluster_centre(self, indices: List[int], models: List[nn.Module]) -> nn.Module:
+    def _gen_cluster_centre(
+        self, cluster: int, indices: List[int], models: List[nn.Module]
+    ) -> nn.Module:
         """
         Takes the average of the clients assigned to each cluster to generate a new centre.
 
         The aggregation method used should be decided prior.
         """
+        clients = [self.clients[i] for i in indices]
+        members = [models[i] for i in indices]
 
-        return self.internalAggregator.aggregate(
-            [self.clients[i] for i in indices], [models[i] for i in indices]
-        )
+        # FedAvg can aggregate straight into the persistent centre module,
+        # avoiding a full model deepcopy per cluster per round
+        if isinstance(self.internalAggregator, FAAggregator):
+            if self.cluster_centres[cluster] is None:
+                self.cluster_centres[cluster] = deepcopy(self.model)
+            return self.internalAggregator.aggregate(
+                clients, members, dest=self.cluster_centres[cluster]
+            )
+
+        return self.internalAggregator.aggregate(clients, members)
 
-    def _generate_weights(self, models: List[nn.Module]) -> List[Tensor]:
+    def _generate_weights(self, models: List[nn.Module]) -> Tensor:
         """
-        Converts each model into a tensor of its parameter weights.
+        Converts the models into a single (num_models, num_parameters) tensor,
+        one row of flattened parameter weights per model.
         """
-        X = []
-        for model in models:
-            X.append(self._generate_coords(model))
+        paramCount = sum(param.numel() for param in models[0].parameters())
+        # BF16 is plenty for direction-only comparisons and halves the
+        # memory traffic of the clustering similarity step
+        X = torch.empty((len(models), paramCount), device=self.device, dtype=torch.bfloat16)
+        with torch.no_grad():
+            for i, model in enumerate(models):
+                X[i] = self._generate_coords(model)
 
         return X
 
@@ -94,12 +114,7 @@ class ClusteringAggregator(Aggregator):
         """
         Converts the model into a flattened torch tensor representing the model's parameters.
         """
-        coords = torch.tensor([]).to(self.device)
-
-        for param in model.parameters():
-            coords = torch.cat((coords, param.data.view(-1)))
-
-        return coords
+        return nn.utils.parameters_to_vector(model.parameters()).detach()
 
     def generate_cluster_centres(self, models: List[nn.Module]) -> None:
         """
@@ -108,23 +123,71 @@ class ClusteringAggregator(Aggregator):
         Aggregate models within clusters to generate cluster centres.
         """
         X = self._generate_weights(models)
-        kmeans = KMeans(n_clusters=self.cluster_count, random_state=0).fit(X)
-
-        self.cluster_labels = kmeans.labels_
-        indices: List[List[int]] = [[] for _ in range(self.cluster_count)]
-        self.cluster_centres_len.zero_()
 
-        for i, l in enumerate(self.cluster_labels):
-            self.cluster_centres_len[l] += 1
-            indices[l].append(i)
+        self.cluster_labels = self._cluster(X).tolist()
+        self.cluster_indices = self._partition_labels(self.cluster_labels, self.cluster_count)
+        self.cluster_centres_len = torch.tensor(
+            [len(ins) for ins in self.cluster_indices], dtype=torch.float
+        ) / len(self.clients)
 
         logPrint(f"Labels: {self.cluster_labels}")
 
-        self.cluster_centres_len /= len(self.clients)
-        for i, ins in enumerate(indices):
-            self.cluster_centres[i] = self._gen_cluster_centre(ins, models)
+        for i, ins in enumerate(self.cluster_indices):
+            self.cluster_centres[i] = self._gen_cluster_centre(i, ins, models)
+
+    def _cluster(self, X: Tensor, max_iter: int = 10) -> Tensor:
+        """
+        Cosine K-Means over the stacked model weights, run entirely on
+        self.device.
+
+        Iterates a fixed number of Lloyd steps with an early break once the
+        cluster assignments stop changing.
+        """
+        Xn = F.normalize(X, dim=1)
+        perm = torch.randperm(X.size(0), device=X.device)
+        centres = Xn[perm[: self.cluster_count]].clone()
+        choices = torch.full((X.size(0),), -1, dtype=torch.long, device=X.device)
+
+        for _ in range(max_iter):
+            sims = Xn @ centres.t()
+            new_choices = sims.argmax(dim=1)
+            if torch.equal(new_choices, choices):
+                break
+            choices = new_choices
+
+            new_centres = torch.zeros_like(centres)
+            new_centres.index_add_(0, choices, Xn)
+            nonempty = torch.bincount(choices, minlength=self.cluster_count) > 0
+            centres[nonempty] = F.normalize(new_centres[nonempty], dim=1)
+
+            # Reseed clusters that lost all their members from the points
+            # least similar to their assigned centre (as sklearn's KMeans
+            # does), reassigning those points immediately so no cluster can
+            # come out of the loop empty and poison the external aggregation
+            if not nonempty.all():
+                empty = (~nonempty).nonzero().flatten()
+                assigned_sims = sims.gather(1, choices.unsqueeze(1)).squeeze(1)
+                worst = assigned_sims.argsort()[: empty.numel()]
+                choices[worst] = empty
+                centres[empty] = Xn[worst]
+
+        return choices
+
+    @staticmethod
+    def _partition_labels(labels, cluster_count: int) -> List[List[int]]:
+        """
+        Partitions the client indices by assigned cluster label.
+
+        Computed once per clustering pass so the per-cluster index lists
+        aren't rebuilt wherever they are needed.
+        """
+        indices: List[List[int]] = [[] for _ in range(cluster_count)]
+        for i, l in enumerate(labels):
+            indices[l].append(i)
+
+        return indices
 
-    def __elbow_test(self, X, models: List[nn.Module]) -> None:
+    def __elbow_test(self, X: Tensor) -> None:
         """
         This is a helper function for calculating the optimum K.
 
@@ -135,36 +198,19 @@ class ClusteringAggregator(Aggregator):
         dispersion = []
 
         for h in range(len(self.clients)):
-            kmeans = KMeans(n_clusters=h + 1, random_state=0).fit(X)
+            kmeans = KMeans(n_clusters=h + 1, random_state=0).fit(X.cpu().float().numpy())
             labels = kmeans.labels_
 
-            indices: List[List[int]] = [[] for _ in range(h + 1)]
-            lens = torch.zeros(h + 1)
-            lens.zero_()
+            indices = self._partition_labels(labels, h + 1)
 
-            centres: List[nn.Module] = []
-
-            for i, l in enumerate(labels):
-                lens[l] += 1
-                indices[l].append(i)
-
-            lens /= len(self.clients)
+            # The centroid mean of the flattened weights is all the
+            # dispersion measure needs - no internal aggregator round-trip
             d = 0
-            for i, ins in enumerate(indices):
-                centres.append(self._gen_cluster_centre(ins, models))
-
-            for i, ins in enumerate(indices):
-                ms = [models[j] for j in ins]
-                c_coords = torch.tensor([]).to(self.device)
-                for param in centres[i].parameters():
-                    c_coords = torch.cat((c_coords, param.data.view(-1)))
-
-                for m in ms:
-                    m_coords = torch.tensor([]).to(self.device)
-                    for param in m.parameters():
-                        m_coords = torch.cat((m_coords, param.data.view(-1)))
-
-                    d += (c_coords - m_coords).square().sum()
+            for ins in indices:
+                if not ins:
+                    continue
+                members = X[ins]
+                d += (members - members.mean(dim=0)).square().sum().item()
 
             dispersion.append(d)
 
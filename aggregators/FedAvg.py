@@ -3,7 +3,7 @@ from experiment.AggregatorConfig import AggregatorConfig
 from torch import nn
 from client import Client
 from logger import logPrint
-from typing import List
+from typing import List, Optional
 import torch
 from aggregators.Aggregator import Aggregator
 from datasetLoaders.DatasetInterface import DatasetInterface
@@ -39,18 +39,28 @@ class FAAggregator(Aggregator):
 
         return roundsError
 
-    def aggregate(self, clients: List[Client], models: List[nn.Module]) -> nn.Module:
-        empty_model = deepcopy(self.model)
+    def aggregate(
+        self, clients: List[Client], models: List[nn.Module], dest: Optional[nn.Module] = None
+    ) -> nn.Module:
+        # Aggregate into the caller's scratch model when given one,
+        # skipping a full deepcopy of the module graph per call
+        empty_model = deepcopy(self.model).to(self.device) if dest is None else dest
         self.renormalise_weights(clients)
 
-        comb = 0.0
+        # Single weighted sum over the client parameters instead of
+        # repeated pairwise merges into the destination model
+        destParams = dict(empty_model.named_parameters())
+        for param in destParams.values():
+            param.data.zero_()
+
+        # Client models come back from training already on self.device, so
+        # no per-model .to(device) walk is needed here. Entries may be full
+        # modules or bare state dicts - no module container is required
+        # just to carry parameters into the average.
         for i, client in enumerate(clients):
-            self._mergeModels(
-                models[i].to(self.device),
-                empty_model.to(self.device),
-                client.p,
-                comb,
-            )
-            comb = 1.0
+            named = models[i].items() if isinstance(models[i], dict) else models[i].named_parameters()
+            for name, param in named:
+                if name in destParams:
+                    destParams[name].data.add_(param.data, alpha=client.p)
 
         return empty_model
@@ -4,6 +4,7 @@ from experiment.AggregatorConfig import AggregatorConfig
 from aggregators.FedMGDAPlusPlus import FedMGDAPlusPlusAggregator
 from aggregators.AFA import AFAAggregator
 from torch import nn, Tensor
+import torch.nn.functional as F
 from client import Client
 from logger import logPrint
 from typing import List, Tuple, Type
@@ -45,6 +46,7 @@ class FedPADRCAggregator(Aggregator):
         self.cluster_centres: List[nn.Module] = [None] * self.cluster_count
         self.cluster_centres_len = torch.zeros(self.cluster_count)
         self.cluster_labels = [0] * len(self.clients)
+        self.cluster_indices: List[List[int]] = [[] for _ in range(self.cluster_count)]
 
         self.internalAggregator: Aggregator = None
         self.externalAggregator: Aggregator = None
@@ -149,13 +151,18 @@ class FedPADRCAggregator(Aggregator):
             [self.clients[i] for i in indices], [models[i] for i in indices]
         )
 
-    def _generate_weights(self, models: List[nn.Module]) -> List[Tensor]:
+    def _generate_weights(self, models: List[nn.Module]) -> Tensor:
         """
-        Converts each model into a tensor of its parameter weights.
+        Converts the models into a single (num_models, num_parameters) tensor,
+        one row of flattened parameter weights per model.
         """
-        X = []
-        for model in models:
-            X.append(self._generate_coords(model))
+        paramCount = sum(param.numel() for param in models[0].parameters())
+        # BF16 is plenty for direction-only comparisons and halves the
+        # memory traffic of the clustering similarity step
+        X = torch.empty((len(models), paramCount), device=self.device, dtype=torch.bfloat16)
+        with torch.no_grad():
+            for i, model in enumerate(models):
+                X[i] = self._generate_coords(model)
 
         return X
 
@@ -163,12 +170,7 @@ class FedPADRCAggregator(Aggregator):
         """
         Converts the model into a flattened torch tensor representing the model's parameters.
         """
-        coords = torch.tensor([]).to(self.device)
-
-        for param in model.parameters():
-            coords = torch.cat((coords, param.data.view(-1)))
-
-        return coords
+        return nn.utils.parameters_to_vector(model.parameters()).detach()
 
     def generate_cluster_centres(self, models: List[nn.Module]) -> None:
         """
@@ -179,25 +181,35 @@ class FedPADRCAggregator(Aggregator):
         Aggregate models within clusters to generate cluster centres.
         """
         X = self._generate_weights(models)
-        X = [model.tolist() for model in X]
 
-        pca = PCA.pca(X)
+        pca = PCA.pca(X.cpu().float().numpy())
         kmeans = KMeans(n_clusters=self.cluster_count, random_state=0).fit(pca)
 
         self.cluster_labels = kmeans.labels_
-        indices: List[List[int]] = [[] for _ in range(self.cluster_count)]
-        self.cluster_centres_len.zero_()
-
-        for i, l in enumerate(self.cluster_labels):
-            self.cluster_centres_len[l] += 1
-            indices[l].append(i)
+        self.cluster_indices = self._partition_labels(self.cluster_labels, self.cluster_count)
+        self.cluster_centres_len = torch.tensor(
+            [len(ins) for ins in self.cluster_indices], dtype=torch.float
+        ) / len(self.clients)
 
         logPrint(f"Labels: {self.cluster_labels}")
 
-        self.cluster_centres_len /= len(self.clients)
-        for i, ins in enumerate(indices):
+        for i, ins in enumerate(self.cluster_indices):
             self.cluster_centres[i] = self._gen_cluster_centre(ins, models)
 
+    @staticmethod
+    def _partition_labels(labels, cluster_count: int) -> List[List[int]]:
+        """
+        Partitions the client indices by assigned cluster label.
+
+        Computed once per clustering pass so the per-cluster index lists
+        aren't rebuilt wherever they are needed.
+        """
+        indices: List[List[int]] = [[] for _ in range(cluster_count)]
+        for i, l in enumerate(labels):
+            indices[l].append(i)
+
+        return indices
+
     def _use_most_similar_clusters(self) -> Tuple[List[nn.Module], Tensor, List[int]]:
         """
         Uses Cosine similarity to determin the "most similar" clusters
@@ -206,13 +218,9 @@ class FedPADRCAggregator(Aggregator):
 
         X = self._generate_weights(self.cluster_centres)
 
-        sims = [[] for _ in range(self.cluster_count)]
-        cos = nn.CosineSimilarity(0)
-
-        for i, m1 in enumerate(X):
-            for m2 in X:
-                sim = cos(m1, m2)
-                sims[i].append(sim)
+        # All-pairs cosine similarity as a single matmul on the normalized rows
+        Xn = F.normalize(X, dim=1)
+        sims = (Xn @ Xn.t()).cpu()
 
         best_val = 0
         best_indices: List[int] = []
@@ -228,7 +236,7 @@ class FedPADRCAggregator(Aggregator):
                 besti = i
 
         # Normalisation
-        ps: Tensor = Tensor([p / sum(sims[besti]) for p in sims[besti]])
+        ps: Tensor = sims[besti] / sims[besti].sum()
         best_models = [self.cluster_centres[i] for i in best_indices]
 
         # If thresholding is being used, threshold the weights based on StD
@@ -252,12 +260,11 @@ class FedPADRCAggregator(Aggregator):
 
         X = self._generate_weights(self.cluster_centres)
 
-        dists = [[] for _ in range(self.cluster_count)]
-
-        for i, m1 in enumerate(X):
-            for m2 in X:
-                l2_dist = (m1 - m2).square().sum()
-                dists[i].append(l2_dist)
+        # All-pairs squared L2 distance in one batched op. cdist has no
+        # BF16 kernel (and magnitudes matter here, unlike the cosine path),
+        # so the distance table is computed in FP32
+        X = X.float()
+        dists = torch.cdist(X, X).square().cpu()
 
         best_val = 100000000000
         best_indices: List[int] = []
@@ -273,7 +280,7 @@ class FedPADRCAggregator(Aggregator):
                 besti = i
 
         # Normalisation
-        ps: Tensor = Tensor([p / sum(dists[besti]) for p in dists[besti]])
+        ps: Tensor = dists[besti] / dists[besti].sum()
         ps = 1 - ps
         ps /= ps.sum()
         best_models = [self.cluster_centres[i] for i in best_indices]
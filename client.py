@@ -40,6 +40,7 @@ class Client:
         model: Optional[nn.Module] = None,
         alpha=3.0,
         beta=3.0,
+        numWorkers=0,
     ):
 
         self.name: str = "client" + str(idx)
@@ -47,7 +48,19 @@ class Client:
 
         self.model: nn.Module = model
         self.trainDataset = trainDataset
-        self.dataLoader = DataLoader(self.trainDataset, batch_size=batchSize, shuffle=True)
+        # Worker processes prepare the next batch while the GPU trains on
+        # the current one, and pinned buffers make the host-to-device copy
+        # asynchronous - keeps image decoding off the training critical
+        # path. Workers persist across rounds so they aren't re-forked for
+        # every trainModel call.
+        self.dataLoader = DataLoader(
+            self.trainDataset,
+            batch_size=batchSize,
+            shuffle=True,
+            num_workers=numWorkers,
+            persistent_workers=numWorkers > 0,
+            pin_memory=device.type == "cuda",
+        )
         self.n: int = len(trainDataset)  # Number of training points provided
         self.p: float = p  # Contribution to the overall model
         self.id: int = idx  # ID for the user
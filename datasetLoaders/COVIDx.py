@@ -1,18 +1,39 @@
 import os
 import sys
+from concurrent.futures import ProcessPoolExecutor
 from shutil import copyfile
-import git
 import cv2
 import numpy as np
 import pandas as pd
-import pydicom as dicom
-from PIL import Image
-from torchvision import transforms
+import torch
+
+# PyArrow's multithreaded CSV parser is several-x faster than pandas';
+# fall back to pandas when it isn't installed
+try:
+    import pyarrow.csv as arrowCsv
+except ImportError:
+    arrowCsv = None
+
 from logger import logPrint
 from datasetLoaders.DatasetLoader import DatasetLoader
 from datasetLoaders.DatasetInterface import DatasetInterface
 
 
+def _convertDicomToPng(paths) -> None:
+    """
+    Decodes one RSNA DICOM file and writes it back out as a PNG.
+
+    Module-level so it can be dispatched to worker processes. pydicom is
+    imported here rather than at module scope so the usual cached-dataset
+    path (and every DataLoader worker) never pays for it.
+    """
+    import pydicom as dicom
+
+    dcmPath, pngPath = paths
+    ds = dicom.dcmread(dcmPath)
+    cv2.imwrite(pngPath, ds.pixel_array)
+
+
 class DatasetLoaderCOVIDx(DatasetLoader):
     def __init__(self, dim=(224, 224), assembleDatasets=True):
         self.assembleDatasets = assembleDatasets
@@ -21,6 +42,12 @@ class DatasetLoaderCOVIDx(DatasetLoader):
         self.testCSV = self.dataPath + "/test_split_v2.txt"
         self.trainCSV = self.dataPath + "/train_split_v2.txt"
         self.COVIDxLabelsDict = {"pneumonia": 0, "normal": 1, "COVID-19": 2}
+        # Sorted label strings plus their codes, built once so each split
+        # read maps labels with a single vectorized searchsorted lookup
+        self.__sortedLabels = np.sort(np.array(list(self.COVIDxLabelsDict)))
+        self.__sortedLabelCodes = np.array(
+            [self.COVIDxLabelsDict[label] for label in self.__sortedLabels]
+        )
 
     def getDatasets(self, percUsers, labels, size=None):
         logPrint("Loading COVIDx...")
@@ -48,6 +75,9 @@ class DatasetLoaderCOVIDx(DatasetLoader):
         trainDataframe = self.__readDataframe(self.trainCSV, trainSize)
         testDataframe = self.__readDataframe(self.testCSV, testSize)
 
+        self.__prepareCache(trainDataframe, isTestDataset=False)
+        self.__prepareCache(testDataframe, isTestDataset=True)
+
         return trainDataframe, testDataframe
 
     def __datasetNotFound(self) -> bool:
@@ -56,26 +86,91 @@ class DatasetLoaderCOVIDx(DatasetLoader):
             or not os.path.exists(self.dataPath + "/train_split_v2.txt")
             or not os.path.exists(self.dataPath + "/test")
             or not os.path.exists(self.dataPath + "/train")
-            or not len(os.listdir(self.dataPath + "/test"))
-            or not len(os.listdir(self.dataPath + "/train"))
+            or not self.__folderNotEmpty(self.dataPath + "/test")
+            or not self.__folderNotEmpty(self.dataPath + "/train")
         ):
             # Might also want to check that files count of
             # /test, /train folder match .txt files
             return True
         return False
 
+    @staticmethod
+    def __folderNotEmpty(path: str) -> bool:
+        # O(1) emptiness check; no need to list thousands of images
+        with os.scandir(path) as entries:
+            return any(True for _ in entries)
+
     def __readDataframe(self, file: str, size: int):
-        dataFrame = pd.read_csv(
-            file,
-            names=["id", "fileNames", "labels"],
-            sep=" ",
-            header=None,
-            usecols=[1, 2],
-        )
-        dataFrame["labels"] = dataFrame["labels"].map(lambda label: self.COVIDxLabelsDict[label])
-        return dataFrame.head(size)
+        if arrowCsv is not None:
+            table = arrowCsv.read_csv(
+                file,
+                read_options=arrowCsv.ReadOptions(column_names=["id", "fileNames", "labels"]),
+                parse_options=arrowCsv.ParseOptions(delimiter=" "),
+            )
+            dataFrame = table.select(["fileNames", "labels"]).to_pandas(self_destruct=True)
+        else:
+            dataFrame = pd.read_csv(
+                file,
+                names=["id", "fileNames", "labels"],
+                sep=" ",
+                header=None,
+                usecols=[1, 2],
+            )
+        # Binary search against the precomputed sorted label array maps the
+        # whole column in one vectorized pass, honouring COVIDxLabelsDict
+        dataFrame["labels"] = self.__sortedLabelCodes[
+            np.searchsorted(self.__sortedLabels, dataFrame["labels"].to_numpy())
+        ]
+        dataFrame = dataFrame.head(size)
+        # Row position in the decoded image cache, preserved through
+        # label filtering and the per-client splits
+        dataFrame["cacheIndex"] = np.arange(len(dataFrame))
+        return dataFrame
+
+    def __prepareCache(self, dataFrame, isTestDataset: bool) -> None:
+        """
+        Decodes and resizes every image once into a uint8 memory-mapped
+        cache file so the datasets never re-decode images per epoch.
+        """
+        split = "test" if isTestDataset else "train"
+        cachePath = "{}/{}_{}_hwc_u8.bin".format(self.dataPath, split, self.dim[0])
+        # Stored HWC exactly as cv2 decodes, so caching is a straight write
+        shape = (len(dataFrame), self.dim[0], self.dim[1], 3)
+
+        if os.path.exists(cachePath) and os.path.getsize(cachePath) == np.prod(shape):
+            return
+
+        logPrint("Caching COVIDx {} images...".format(split))
+        cache = np.memmap(cachePath, dtype=np.uint8, mode="w+", shape=shape)
+        for i, fileName in enumerate(dataFrame["fileNames"].values):
+            imgPath = os.path.join(self.dataPath, split, fileName)
+            img = cv2.imread(imgPath)
+            if img is None:
+                print("IMAGE DOES NOT EXIST {}".format(imgPath))
+                continue
+            img = cv2.resize(img, self.dim, interpolation=cv2.INTER_AREA)
+            cache[i] = cv2.cvtColor(img, cv2.COLOR_BGR2RGB)
+        cache.flush()
+
+    @staticmethod
+    def __fastCopy(src: str, dst: str) -> None:
+        """
+        Hard-links src to dst (metadata-only, no bytes moved), falling back
+        to a real copy when linking isn't possible (cross-device, existing
+        dst, unsupported filesystem). shutil.copyfile uses in-kernel
+        sendfile on Linux, so the fallback never buffers through Python.
+        """
+        try:
+            os.link(src, dst)
+        except OSError:
+            copyfile(src, dst)
 
     def __joinDatasets(self):
+        # Only the one-off assembly step needs GitPython; importing it here
+        # keeps it (and the gitdb/smmap machinery it drags in) off the
+        # startup path of normal runs and DataLoader workers
+        import git
+
         dataSources = [
             "/covid-chestxray-dataset",
             "/rsna-kaggle-dataset",
@@ -166,12 +261,13 @@ class DatasetLoaderCOVIDx(DatasetLoader):
         filename_label = {"normal": [], "pneumonia": [], "COVID-19": []}
         count = {"normal": 0, "pneumonia": 0, "COVID-19": 0}
         print(csv.keys())
-        for index, row in csv.iterrows():
-            f = row["finding"]
-            if f in mapping:
-                count[mapping[f]] += 1
-                entry = [int(row["patientid"]), row["filename"], mapping[f]]
-                filename_label[mapping[f]].append(entry)
+        csv = csv[csv["finding"].isin(mapping)]
+        for label, group in csv.groupby(csv["finding"].map(mapping)):
+            count[label] = len(group)
+            filename_label[label] = [
+                [int(patientId), fileName, label]
+                for patientId, fileName in zip(group["patientid"], group["filename"])
+            ]
 
         print("Data distribution from covid-chestxray-dataset:")
         print(count)
@@ -192,25 +288,22 @@ class DatasetLoaderCOVIDx(DatasetLoader):
             # num_diff_patients = len(np.unique(arr[:,0]))
             # num_test = max(1, round(split*num_diff_patients))
             # select num_test number of random patients
+            # frozenset gives O(1) membership tests in the patient loop below
             if key == "pneumonia":
-                test_patients = ["8", "31"]
+                test_patients = frozenset(["8", "31"])
             elif key == "COVID-19":
-                test_patients = [
-                    "19",
-                    "20",
-                    "36",
-                    "42",
-                    "86",
-                ]  # random.sample(list(arr[:,0]), num_test)
+                test_patients = frozenset(
+                    ["19", "20", "36", "42", "86"]
+                )  # random.sample(list(arr[:,0]), num_test)
             else:
-                test_patients = []
+                test_patients = frozenset()
             print("Key: ", key)
             print("Test patients: ", test_patients)
             # go through all the patients
             for patient in arr:
                 if patient[0] in test_patients:
                     if COPY_FILE:
-                        copyfile(
+                        self.__fastCopy(
                             os.path.join(imgPath, patient[1]),
                             os.path.join(self.dataPath, "test", patient[1]),
                         )
@@ -221,7 +314,7 @@ class DatasetLoaderCOVIDx(DatasetLoader):
                         break
                 else:
                     if COPY_FILE:
-                        copyfile(
+                        self.__fastCopy(
                             os.path.join(imgPath, patient[1]),
                             os.path.join(self.dataPath, "train", patient[1]),
                         )
@@ -240,16 +333,12 @@ class DatasetLoaderCOVIDx(DatasetLoader):
         print(kaggle_dataPath)
         csv_normal = pd.read_csv(os.path.join(kaggle_dataPath, kaggle_csvname), nrows=None)
         csv_pneu = pd.read_csv(os.path.join(kaggle_dataPath, kaggle_csvname2), nrows=None)
-        patients = {"normal": [], "pneumonia": []}
-
-        for index, row in csv_normal.iterrows():
-            if row["class"] == "Normal":
-                patients["normal"].append(row["patientId"])
-
-        for index, row in csv_pneu.iterrows():
-            if int(row["Target"]) == 1:
-                patients["pneumonia"].append(row["patientId"])
+        patients = {
+            "normal": csv_normal.loc[csv_normal["class"] == "Normal", "patientId"].tolist(),
+            "pneumonia": csv_pneu.loc[csv_pneu["Target"].astype(int) == 1, "patientId"].tolist(),
+        }
 
+        conversions = []
         for key in patients.keys():
             arr = np.array(patients[key])
             if arr.size == 0:
@@ -258,20 +347,17 @@ class DatasetLoaderCOVIDx(DatasetLoader):
             # num_diff_patients = len(np.unique(arr))
             # num_test = max(1, round(split*num_diff_patients))
             # '/content/COVID-Net/'
-            test_patients = np.load(
-                self.dataPath + "/COVID-Net/rsna_test_patients_{}.npy" "".format(key)
+            test_patients = frozenset(
+                np.load(
+                    self.dataPath + "/COVID-Net/rsna_test_patients_{}.npy" "".format(key)
+                ).tolist()
             )  # random.sample(list(arr), num_test)
             # np.save('rsna_test_patients_{}.npy'.format(key), np.array(test_patients))
             for patient in arr:
-                ds = dicom.dcmread(os.path.join(kaggle_dataPath, kaggle_imgPath, patient + ".dcm"))
-                pixel_array_numpy = ds.pixel_array
                 imgname = patient + ".png"
                 if patient in test_patients:
                     if COPY_FILE:
-                        cv2.imwrite(
-                            os.path.join(self.dataPath, "test", imgname),
-                            pixel_array_numpy,
-                        )
+                        split_folder = "test"
                         test.append([patient, imgname, key])
                         test_count[key] += 1
                     else:
@@ -279,15 +365,28 @@ class DatasetLoaderCOVIDx(DatasetLoader):
                         break
                 else:
                     if COPY_FILE:
-                        cv2.imwrite(
-                            os.path.join(self.dataPath, "train", imgname),
-                            pixel_array_numpy,
-                        )
+                        split_folder = "train"
                         train.append([patient, imgname, key])
                         train_count[key] += 1
                     else:
                         print("WARNING: passing copy file.")
                         break
+                conversions.append(
+                    (
+                        os.path.join(kaggle_dataPath, kaggle_imgPath, patient + ".dcm"),
+                        os.path.join(self.dataPath, split_folder, imgname),
+                    )
+                )
+
+        # The pneumonia CSV has one row per bounding box, so patients repeat;
+        # dedupe so two workers never race on writing the same PNG
+        conversions = list(dict.fromkeys(conversions))
+
+        # DICOM decode + PNG encode is embarrassingly parallel across cores;
+        # chunking amortises the pickling overhead of the small path tuples
+        with ProcessPoolExecutor(max_workers=os.cpu_count()) as executor:
+            list(executor.map(_convertDicomToPng, conversions, chunksize=64))
+
         print("test count: ", test_count)
         print("train count: ", train_count)
 
@@ -299,45 +398,62 @@ class DatasetLoaderCOVIDx(DatasetLoader):
         print("Total length of test: ", len(test))
 
         # export to train and test csv
-        # format as patientid, filename, label - separated by a space
-        train_file = open(self.dataPath + "/train_split_v2.txt", "w")
-        for sample in train:
-            info = str(sample[0]) + " " + sample[1] + " " + sample[2] + "\n"
-            train_file.write(info)
-        train_file.close()
-
-        test_file = open(self.dataPath + "/test_split_v2.txt", "w")
-        for sample in test:
-            info = str(sample[0]) + " " + sample[1] + " " + sample[2] + "\n"
-            test_file.write(info)
-        test_file.close()
+        # format as patientid, filename, label - separated by a space;
+        # joined once and written in a single call rather than per line
+        with open(self.dataPath + "/train_split_v2.txt", "w") as train_file:
+            train_file.write("".join(f"{s[0]} {s[1]} {s[2]}\n" for s in train))
+
+        with open(self.dataPath + "/test_split_v2.txt", "w") as test_file:
+            test_file.write("".join(f"{s[0]} {s[1]} {s[2]}\n" for s in test))
 
     class COVIDxDataset(DatasetInterface):
+        mean = torch.tensor([0.485, 0.456, 0.406]).view(3, 1, 1)
+        std = torch.tensor([0.229, 0.224, 0.225]).view(3, 1, 1)
+
         def __init__(self, dataframe, isTestDataset=False):
             self.root = "./data/COVIDx/" + ("test/" if isTestDataset else "train/")
-            self.paths = dataframe["fileNames"]
+            # Full paths precomputed into a plain array: positional indexing
+            # with no pandas label lookup or string concat per __getitem__
+            self.paths = (self.root + dataframe["fileNames"].astype(str)).to_numpy(dtype=object)
+
+            # Read the images out of the pre-decoded uint8 cache when the
+            # loader has built one, falling back to per-image decoding
+            split = "test" if isTestDataset else "train"
+            cachePath = "./data/COVIDx/{}_224_hwc_u8.bin".format(split)
+            self.cache = None
+            if "cacheIndex" in dataframe and os.path.exists(cachePath):
+                count = os.path.getsize(cachePath) // (224 * 224 * 3)
+                self.cache = np.memmap(
+                    cachePath, dtype=np.uint8, mode="r", shape=(count, 224, 224, 3)
+                )
+                self.cacheIndices = dataframe["cacheIndex"].values
+
             super().__init__(dataframe["labels"].values)
 
         def __getitem__(self, index):
-            imageTensor = self.__load_image(self.root + self.paths[index])
+            if self.cache is not None:
+                imageTensor = self.__toNormalisedTensor(self.cache[self.cacheIndices[index]])
+            else:
+                imageTensor = self.__load_image(self.paths[index])
             labelTensor = self.labels[index]
             return imageTensor, labelTensor
 
-        @staticmethod
-        def __load_image(img_path: str) -> Image:
+        def __load_image(self, img_path: str) -> torch.Tensor:
             if not os.path.exists(img_path):
                 print("IMAGE DOES NOT EXIST {}".format(img_path))
-            image = Image.open(img_path).convert("RGB")
-            image = image.resize((224, 224)).convert("RGB")
-
-            transform = transforms.Compose(
-                [
-                    transforms.ToTensor(),
-                    transforms.Normalize(mean=[0.485, 0.456, 0.406], std=[0.229, 0.224, 0.225]),
-                ]
-            )
-            # if(imageTensor.size(0)>1):
-            #     #print(img_path," > 1 channels")
-            #     imageTensor = imageTensor.mean(dim=0,keepdim=True)
-            imageTensor = transform(image)
-            return imageTensor
+            # cv2 decodes through libjpeg-turbo and resizes with SIMD,
+            # both noticeably faster than the PIL route
+            image = cv2.imread(img_path)
+            image = cv2.resize(image, (224, 224), interpolation=cv2.INTER_AREA)
+            image = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
+            return self.__toNormalisedTensor(image)
+
+        def __toNormalisedTensor(self, image: np.ndarray) -> torch.Tensor:
+            """
+            Fused ToTensor+Normalize over an HWC uint8 image: the uint8
+            data is read once and the fp32 result is normalised in place
+            against the cached mean/std buffers - one allocation, no
+            intermediate fp32 copies.
+            """
+            imageTensor = torch.from_numpy(np.ascontiguousarray(image))
+            return imageTensor.permute(2, 0, 1).float().div_(255.0).sub_(self.mean).div_(self.std)
@@ -20,9 +20,9 @@ class DatasetInterface(Dataset):
 
     def zeroLabels(self) -> None:
         """
-        Sets all labels to zero
+        Sets all labels to zero in place
         """
-        self.labels = torch.zeros(len(self.labels), dtype=torch.long)
+        self.labels.zero_()
 
     def setLabels(self, value: int) -> None:
         """
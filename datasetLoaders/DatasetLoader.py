@@ -61,6 +61,35 @@ class DatasetLoader:
         ]
         return clientDatasets
 
+    @staticmethod
+    def _splitTrainDataIntoClientArrays(
+        percUsers: Tensor, x: np.ndarray, y: np.ndarray, DatasetType: Type[DatasetInterface]
+    ) -> List[DatasetInterface]:
+        """
+        Splits contiguous (x, y) train arrays into individual datasets for
+        each client, skipping the object-dtype dataframe hop entirely.
+
+        Uses percUsers to decide how much data (by %) each client should get.
+        """
+        DatasetLoader._setRandomSeeds()
+        percUsers = percUsers / percUsers.sum()
+
+        dataSplitCount = (percUsers.cpu() * len(x)).floor().numpy()
+        _, *dataSplitIndex = [
+            int(sum(dataSplitCount[range(i)])) for i in range(len(dataSplitCount))
+        ]
+
+        # Shuffle both arrays in unison before splitting
+        shuffle = np.random.permutation(len(x))
+        x = x[shuffle]
+        y = y[shuffle]
+
+        clientDatasets: List[DatasetInterface] = [
+            DatasetType(xSplit, ySplit)
+            for xSplit, ySplit in zip(np.split(x, dataSplitIndex), np.split(y, dataSplitIndex))
+        ]
+        return clientDatasets
+
     @staticmethod
     def _setRandomSeeds(seed=0) -> None:
         os.environ["PYTHONHASHSEED"] = str(seed)
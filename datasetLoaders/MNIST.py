@@ -3,7 +3,6 @@ from typing import List, Optional, Tuple
 import numpy as np
 from datasetLoaders.DatasetLoader import DatasetLoader
 from datasetLoaders.DatasetInterface import DatasetInterface
-from pandas import DataFrame
 from torch.tensor import Tensor
 from torchvision import transforms, datasets
 from logger import logPrint
@@ -16,48 +15,41 @@ class DatasetLoaderMNIST(DatasetLoader):
     ) -> Tuple[List[DatasetInterface], DatasetInterface]:
         logPrint("Loading MNIST...")
         self._setRandomSeeds()
-        data = self.__loadMNISTData()
-        trainDataframe, testDataframe = self._filterDataByLabel(labels, *data)
-        clientDatasets = self._splitTrainDataIntoClientDatasets(
-            percUsers, trainDataframe, self.MNISTDataset
+        xTrain, yTrain, xTest, yTest = self.__loadMNISTData()
+
+        # Keep only the considered labels
+        trainMask = np.isin(yTrain, labels.numpy())
+        testMask = np.isin(yTest, labels.numpy())
+
+        clientDatasets = self._splitTrainDataIntoClientArrays(
+            percUsers, xTrain[trainMask], yTrain[trainMask], self.MNISTDataset
         )
-        testDataset = self.MNISTDataset(testDataframe)
+        testDataset = self.MNISTDataset(xTest[testMask], yTest[testMask])
         return clientDatasets, testDataset
 
     @staticmethod
-    def __loadMNISTData() -> Tuple[DataFrame, DataFrame]:
+    def __loadMNISTData() -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
         trans = transforms.Compose([transforms.ToTensor(), transforms.Normalize((0.5,), (1.0,))])
 
         # if not exist, download mnist dataset
         trainSet = datasets.MNIST("data", train=True, transform=trans, download=True)
         testSet = datasets.MNIST("data", train=False, transform=trans, download=True)
 
-        # Scale pixel intensities to [-1, 1]
-        xTrain: Tensor = trainSet.train_data
-        xTrain = 2 * (xTrain.float() / 255.0) - 1
-        # list of 2D images to 1D pixel intensities
-        xTrain = xTrain.flatten(1, 2).numpy()
+        # Scale pixel intensities to [-1, 1] in place on the float copy and
+        # flatten the 2D images to 1D pixel intensities - no intermediates
+        xTrain: np.ndarray = trainSet.train_data.float().div_(127.5).sub_(1.0).flatten(1, 2).numpy()
         yTrain = trainSet.train_labels.numpy()
 
-        # Scale pixel intensities to [-1, 1]
-        xtest: Tensor = testSet.test_data.clone().detach()
-        xtest = 2 * (xtest.float() / 255.0) - 1
-        # list of 2D images to 1D pixel intensities
-        xTest: np.ndarray = xtest.flatten(1, 2).numpy()
+        xTest: np.ndarray = testSet.test_data.float().div_(127.5).sub_(1.0).flatten(1, 2).numpy()
         yTest: np.ndarray = testSet.test_labels.numpy()
 
-        trainDataframe = DataFrame(zip(xTrain, yTrain))
-        testDataframe = DataFrame(zip(xTest, yTest))
-        trainDataframe.columns = testDataframe.columns = ["data", "labels"]
-
-        return trainDataframe, testDataframe
+        return xTrain, yTrain, xTest, yTest
 
     class MNISTDataset(DatasetInterface):
-        def __init__(self, dataframe):
-            self.data = torch.stack(
-                [torch.from_numpy(data) for data in dataframe["data"].values], dim=0
-            )
-            super().__init__(dataframe["labels"].values)
+        def __init__(self, x: np.ndarray, y: np.ndarray):
+            # Zero-copy view over the contiguous image array
+            self.data = torch.from_numpy(x)
+            super().__init__(y)
 
         def __len__(self):
             return len(self.data)
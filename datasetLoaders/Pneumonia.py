@@ -118,6 +118,17 @@ class DatasetLoaderPneumonia(DatasetLoader):
                 exit(0)
 
     class PneumoniaDataset(DatasetInterface):
+        # Built once rather than per __getitem__ call; the random
+        # augmentations still re-roll on every application
+        transform = transforms.Compose(
+            [
+                transforms.ToTensor(),
+                transforms.RandomRotation(30),
+                transforms.RandomHorizontalFlip(),
+                # transforms.Normalize(mean=[0.5], std=[0.5]),
+            ]
+        )
+
         def __init__(self, dataframe: DataFrame, isTestDataset=False):
             self.root = "./data/Pneumonia/" + ("test/" if isTestDataset else "train/")
             self.imgs: List[np.ndarray] = dataframe["img"]
@@ -128,15 +139,5 @@ class DatasetLoaderPneumonia(DatasetLoader):
             labelTensor = self.labels[index]
             return imageTensor, labelTensor
 
-        @staticmethod
-        def __load_image(image: np.ndarray) -> np.ndarray:
-            transform = transforms.Compose(
-                [
-                    transforms.ToTensor(),
-                    transforms.RandomRotation(30),
-                    transforms.RandomHorizontalFlip(),
-                    # transforms.Normalize(mean=[0.5], std=[0.5]),
-                ]
-            )
-            imageTensor = transform(image)
-            return imageTensor
+        def __load_image(self, image: np.ndarray) -> np.ndarray:
+            return self.transform(image)
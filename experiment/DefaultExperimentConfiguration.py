@@ -24,6 +24,9 @@ class DefaultExperimentConfiguration:
         self.epochs: int = 2
 
         self.batchSize: int = 200  # Local training  batch size
+        # DataLoader worker processes per client; worth >0 only for the
+        # image datasets where decode/augment dominates the batch time
+        self.dataLoaderNumWorkers: int = 0
         self.learningRate: float = 0.1
         self.Loss = nn.CrossEntropyLoss
         self.Optimizer: Type[optim.Optimizer] = optim.SGD
@@ -92,6 +92,8 @@ def __experimentOnCOVIDx(
     COVIDx Experiment with default settings
     """
     datasetLoader = DatasetLoaderCOVIDx().getDatasets
+    # Image decode dominates batch time here, so prefetch in workers
+    config.dataLoaderNumWorkers = 2
     if model == "COVIDNet":
         classifier = CovidNet.Classifier
     elif model == "resnet18":
@@ -114,6 +116,8 @@ def __experimentOnPneumonia(
     config.labels = torch.tensor([0, 1])
     config.Loss = nn.BCELoss
     config.Optimizer = optim.RMSprop
+    # Per-sample augmentation is the bottleneck, so prefetch in workers
+    config.dataLoaderNumWorkers = 2
 
     return __experimentSetup(config, datasetLoader, classifier, title, filename, folder)
 
@@ -159,25 +163,28 @@ def __experimentSetup(
             errors, block = __runExperiment(
                 config, datasetLoader, classifier, aggregator, config.privacyPreserve, folder
             )
+            errorsDict[name] = errors
+            blocked[name] = block
         else:
+            # Record both runs rather than letting the DP result overwrite
+            # the non-DP one
             errors, block = __runExperiment(
                 config, datasetLoader, classifier, aggregator, False, folder
             )
+            errorsDict[name + "_noDP"] = errors
+            blocked[name + "_noDP"] = block
             logPrint("TRAINING {} with DP".format(name))
             errors, block = __runExperiment(
                 config, datasetLoader, classifier, aggregator, True, folder
             )
-
-        errorsDict[name] = errors
-        blocked[name] = block
+            errorsDict[name + "_DP"] = errors
+            blocked[name + "_DP"] = block
 
     # Writing the blocked lists to json file for later inspection
-    if not os.path.isdir(folder):
-        os.makedirs(folder)
-    if not os.path.isdir(f"{folder}/json"):
-        os.mkdir(f"{folder}/json")
-    if not os.path.isdir(f"{folder}/graphs"):
-        os.mkdir(f"{folder}/graphs")
+    # exist_ok spares the separate isdir stat per directory, and creating
+    # the leaves also creates the parent folder
+    os.makedirs(f"{folder}/json", exist_ok=True)
+    os.makedirs(f"{folder}/graphs", exist_ok=True)
     with open(f"{folder}/json/{filename}.json", "w+") as outfile:
         json.dump(blocked, outfile)
 
@@ -218,8 +225,9 @@ def __runExperiment(
     clients = __initClients(config, trainDatasets, useDifferentialPrivacy)
     # Requires model input size update due to dataset generalisation and categorisation
     if config.requireDatasetAnonymization:
-        classifier.inputSize = testDataset.getInputSize()
-    model = classifier().to(config.aggregatorConfig.device)
+        model = classifier(testDataset.getInputSize()).to(config.aggregatorConfig.device)
+    else:
+        model = classifier().to(config.aggregatorConfig.device)
     name = agg.__name__.replace("Aggregator", "")
 
     aggregator = agg(clients, model, config.aggregatorConfig)
@@ -242,21 +250,26 @@ def __runExperiment(
         }
     )
 
-    # Plot mean and std values from the clients
-    if config.aggregatorConfig.detectFreeRiders:
+    # Plot mean and std values from the clients; skipped entirely in
+    # headless batch runs - no figures and no host tensor copies
+    if config.aggregatorConfig.detectFreeRiders and config.plotResults:
 
         if not os.path.exists(f"{folder}/std/{name}"):
             os.makedirs(f"{folder}/std/{name}")
         if not os.path.exists(f"{folder}/mean/{name}"):
             os.makedirs(f"{folder}/mean/{name}")
 
+        # One transfer for the whole (clients x rounds) matrix rather than
+        # one per plotted line
+        means = aggregator.means.detach().cpu().numpy()
+
         fig = plt.figure()
         ax = fig.add_subplot(1, 1, 1)
         for i in range(30):
             if clients[i].free or clients[i].byz or clients[i].flip:
-                ax.plot(aggregator.means[i].detach().numpy(), color="red", label="free")
+                ax.plot(means[i], color="red", label="free")
             else:
-                ax.plot(aggregator.means[i].detach().numpy(), color="grey", label="normal")
+                ax.plot(means[i], color="grey", label="normal")
         handles, labels = ax.get_legend_handles_labels()
         plt.legend([handles[1], handles[2]], [labels[1], labels[2]])
         plt.xlabel(f"Rounds - {config.epochs} Epochs per Round")
@@ -267,13 +280,15 @@ def __runExperiment(
         plt.savefig(f"{folder}/mean/{name}/{config.name}.png")
         # plt.show()
 
+        stds = aggregator.stds.detach().cpu().numpy()
+
         fig = plt.figure()
         ax = fig.add_subplot(1, 1, 1)
         for i in range(30):
             if clients[i].free or clients[i].byz or clients[i].flip:
-                ax.plot(aggregator.stds[i].detach().numpy(), color="red", label="free")
+                ax.plot(stds[i], color="red", label="free")
             else:
-                ax.plot(aggregator.stds[i].detach().numpy(), color="grey", label="normal")
+                ax.plot(stds[i], color="grey", label="normal")
         handles, labels = ax.get_legend_handles_labels()
         plt.legend([handles[1], handles[2]], [labels[1], labels[2]])
         plt.xlabel(f"Rounds - {config.epochs} Epochs per Round")
@@ -319,24 +334,30 @@ def __initClients(
                 clipValue=config.clipValue,
                 needNormalization=config.needNormalization,
                 releaseProportion=config.releaseProportion,
+                numWorkers=config.dataLoaderNumWorkers,
             )
         )
 
-    nTrain = sum([client.n for client in clients])
-    # Weight the value of the update of each user according to the number of training data points
-    for client in clients:
-        client.p = client.n / nTrain
-
-    # Create malicious (byzantine) and faulty users
+    # Weight the value of the update of each user according to the number of
+    # training data points, normalised in one vectorized pass
+    ns = np.fromiter((client.n for client in clients), dtype=np.float64, count=len(clients))
+    for client, p in zip(clients, ns / ns.sum()):
+        client.p = float(p)
+
+    # Create malicious (byzantine) and faulty users; hashed sets make the
+    # three membership tests per client O(1) rather than list scans
+    faulty = frozenset(config.faulty)
+    malicious = frozenset(config.malicious)
+    freeRiding = frozenset(config.freeRiding)
     for client in clients:
-        if client.id in config.faulty:
+        if client.id in faulty:
             client.byz = True
             logPrint("User", client.id, "is faulty.")
-        if client.id in config.malicious:
+        if client.id in malicious:
             client.flip = True
             logPrint("User", client.id, "is malicious.")
             client.trainDataset.zeroLabels()
-        if client.id in config.freeRiding:
+        if client.id in freeRiding:
             client.free = True
             logPrint("User", client.id, "is Free-Riding.")
     return clients